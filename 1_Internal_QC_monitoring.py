@@ -3,13 +3,54 @@
 import streamlit as st
 st.set_page_config(layout="wide", page_title="QC Module", page_icon="📈")
 from datetime import datetime
+from collections import OrderedDict
+import csv
+import hashlib
+import io
 import math
+import threading
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 
 
+# Cumulative exports are usually re-uploaded in a new browser session, so parsed uploads and
+# CUSUM state live in a store shared by all sessions (st.cache_resource), keyed by content digest.
+# Entries are dropped least recently used first once their total size exceeds the byte budget.
+FINGERPRINT_STORE_BYTES = 256 * 1024 * 1024
+
+@st.cache_resource
+def fingerprint_store():
+    return {'lock': threading.Lock(), 'entries': OrderedDict(), 'sizes': {}, 'total': 0}
+
+def store_get(key):
+    store = fingerprint_store()
+    with store['lock']:
+        entry = store['entries'].get(key)
+        if entry is not None:
+            store['entries'].move_to_end(key)
+        return entry
+
+def store_put(key, entry, nbytes):
+    if nbytes > FINGERPRINT_STORE_BYTES:
+        return
+    store = fingerprint_store()
+    with store['lock']:
+        store['total'] += nbytes - store['sizes'].get(key, 0)
+        store['entries'][key] = entry
+        store['sizes'][key] = nbytes
+        store['entries'].move_to_end(key)
+        while store['total'] > FINGERPRINT_STORE_BYTES:
+            evicted_key, _ = store['entries'].popitem(last=False)
+            store['total'] -= store['sizes'].pop(evicted_key)
+
+def store_items(key_prefix):
+    store = fingerprint_store()
+    with store['lock']:
+        return [(key, entry) for key, entry in store['entries'].items() if key[:len(key_prefix)] == key_prefix]
+
+
 with st.sidebar:
     st.header("QC Module")
     with open('./template/template_IQC.xlsx', "rb") as template_file:
@@ -22,12 +63,59 @@ with st.sidebar:
       # upload file
     uploaded_file = st.file_uploader('#### **Upload your .xlsx (Excel) or .csv file:**', type=['csv','xlsx'], accept_multiple_files=False)
     
+    def read_uploaded_file(file):
+        # cumulative .csv exports repeat an earlier upload byte for byte, so only the appended tail is parsed.
+        # Stored frames are shared by all sessions, so a copy is returned.
+        file_bytes = file.getvalue()
+        # one incremental hash pass checks every stored prefix length and yields the full-file digest
+        prefix_lengths = sorted({key[1] for key, _ in store_items(('upload',)) if key[1] <= len(file_bytes)})
+        hasher = hashlib.sha256()
+        position = 0
+        match = None
+        for length in prefix_lengths:
+            hasher.update(file_bytes[position:length])
+            position = length
+            entry = store_get(('upload', length, hasher.hexdigest()))
+            if entry is not None:
+                match = (length, entry)
+        hasher.update(file_bytes[position:])
+        digest = hasher.hexdigest()
+
+        frame = None
+        if match is not None:
+            length, entry = match
+            sep = entry['sep']
+            tail_bytes = file_bytes[length:]
+            # a header shorter than the rows makes pandas use the first column as index, which the tail can't continue
+            if tail_bytes.strip() and isinstance(entry['frame'].index, pd.RangeIndex):
+                tail = pd.read_csv(io.BytesIO(tail_bytes), sep=sep, header=None,
+                                   names=entry['frame'].columns, engine='python')
+                # a tail typed differently from the prefix would not match a full parse
+                if tail.dtypes.equals(entry['frame'].dtypes):
+                    frame = pd.concat([entry['frame'], tail], ignore_index=True)
+            elif not tail_bytes.strip():
+                frame = entry['frame']
+        if frame is None:
+            try:
+                frame = pd.read_excel(io.BytesIO(file_bytes))
+                sep = None
+            except:
+                frame = pd.read_csv(io.BytesIO(file_bytes), sep=None, engine='python')
+                # same delimiter detection as pandas (first line), kept for parsing later tails
+                first_line = file_bytes.split(b'\n', 1)[0].decode('utf-8', errors='ignore')
+                try:
+                    sep = csv.Sniffer().sniff(first_line).delimiter
+                except csv.Error:
+                    sep = None
+        # a byte prefix can only be reused for a .csv file that ends on a complete row
+        if sep is not None and file_bytes.endswith(b'\n') and (match is None or match[0] != len(file_bytes)):
+            store_put(('upload', len(file_bytes), digest), {'sep': sep, 'frame': frame},
+                      frame.memory_usage(deep=True).sum())
+        return frame.copy()
+
     def process_file(file):
         # data of analyte selection
-        try:
-            uploaded_file = pd.read_excel(file)
-        except:
-            uploaded_file = pd.read_csv(file, sep=None, engine='python')
+        uploaded_file = read_uploaded_file(file)
         analyte_name_box = st.selectbox("**Select IQC result Column**", tuple(uploaded_file.columns))
         analyte_data = uploaded_file[analyte_name_box]
         analyte_data = analyte_data.dropna(axis=0).reset_index()
@@ -58,6 +146,7 @@ with tab1:
     - The sidebar also includes a file upload section where users can upload Excel (.xlsx) or CSV (.csv) files. Users can either drag and drop files or use the "Browse files" button to select files from their folders.
     - The application reads the uploaded file, processes both Excel and CSV formats, and prompts users to select a column representing IQC results.
     - The selected column is processed, removing missing values and resetting the index for further analysis.
+    - When a cumulative export is uploaded again with new results appended, only the appended rows are parsed (.csv), also in a new browser session. With a custom mean and standard deviation, the CUSUM values of the already-seen results are reused as well; a mean and SD calculated from the data change with every new result, so the CUSUM is then recalculated.
 
     ##### :blue[Tabs]
 
@@ -395,20 +484,53 @@ with tab2:
         st.write("---")
         
         # CUSUM PLOT
-        def plot_cusum(cusum_np_arr, mu, sd, k=0.5, h=5):
+        # row fingerprints of the data, used to find the part already evaluated in a previous run
+        def row_fingerprints(data):
+            return pd.util.hash_pandas_object(data, index=False).to_numpy()
+
+        def common_prefix_length(new_hashes, old_hashes):
+            n = min(len(new_hashes), len(old_hashes))
+            mismatch = np.flatnonzero(new_hashes[:n] != old_hashes[:n])
+            return int(mismatch[0]) if len(mismatch) else n
+
+        def longest_stored_prefix(key_prefix, hashes):
+            # stored state (from any session) sharing the longest run of leading rows with this data
+            start, best = 0, None
+            for _, entry in store_items(key_prefix):
+                length = common_prefix_length(hashes, entry['hashes'])
+                if length > start:
+                    start, best = length, entry
+            return start, best
+
+        def cached_cusum(cusum_np_arr, mu, sd, k=0.5, reuse=False):
+            # with a custom mean/SD, Cp/Cn of the already-seen prefix are reused; a mean/SD taken
+            # from the data changes with every new result, so that state would never be matched again
+            reusable = reuse and math.isfinite(mu) and math.isfinite(sd)
+            start, entry = 0, None
+            if reusable:
+                hashes = row_fingerprints(cusum_np_arr)
+                start, entry = longest_stored_prefix(('cusum', (mu, sd, k)), hashes)
+            values = cusum_np_arr.to_numpy(dtype=float)
+            Cp = np.zeros(len(values))
+            Cm = np.zeros(len(values))
+            if start:
+                Cp[:start] = entry['Cp'][:start]
+                Cm[:start] = entry['Cm'][:start]
+
+            for ii in range(max(start, 1), len(values)):
+                Cp[ii] = max(((values[ii] - mu) / sd) - k + Cp[ii - 1], 0)
+                Cm[ii] = max(-k - ((values[ii] - mu) / sd) + Cm[ii - 1], 0)
+
+            if reusable:
+                store_put(('cusum', (mu, sd, k), hashlib.sha256(hashes.tobytes()).hexdigest()),
+                          {'hashes': hashes, 'Cp': Cp, 'Cm': Cm}, hashes.nbytes + Cp.nbytes + Cm.nbytes)
+            return pd.Series(Cp, copy=True), pd.Series(Cm, copy=True)
+
+        def plot_cusum(cusum_np_arr, mu, sd, k=0.5, h=5, reuse=False):
             # Drop rows with None values in 'Data' column
             cusum_np_arr = cusum_np_arr.dropna().reset_index(drop=True)
             
-            Cp = (cusum_np_arr * 0).copy()
-            Cm = Cp.copy()
-
-            for ii in np.arange(len(cusum_np_arr)):
-                if ii == 0:
-                    Cp[ii] = 0
-                    Cm[ii] = 0
-                else:
-                    Cp[ii] = np.max([0, ((cusum_np_arr[ii] - mu) / sd) - k + Cp[ii - 1]])
-                    Cm[ii] = np.max([0, -k - ((cusum_np_arr[ii] - mu) / sd) + Cm[ii - 1]])
+            Cp, Cm = cached_cusum(cusum_np_arr, mu, sd, k, reuse)
 
             Cont_limit_arr = np.array(h * np.ones((len(cusum_np_arr), 1)))
             Cont_lim_df = pd.DataFrame(Cont_limit_arr, columns=["h"])
@@ -447,7 +569,7 @@ with tab2:
             # Show figure
             st.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
-        plot_cusum(df['Data'], mean, std_dev)
+        plot_cusum(df['Data'], mean, std_dev, reuse=APC_select == "Custom")
         
         # This part add cusum results to the dataframe
         cusum_np_arr = df['Data'].dropna().reset_index(drop=True)
@@ -455,16 +577,7 @@ with tab2:
         h=5    
         mu = mean
         sd = std_dev
-        Cp = (cusum_np_arr * 0).copy()
-        Cm = Cp.copy()
-
-        for ii in np.arange(len(cusum_np_arr)):
-            if ii == 0:
-                Cp[ii] = 0
-                Cm[ii] = 0
-            else:
-                Cp[ii] = np.max([0, ((cusum_np_arr[ii] - mu) / sd) - k + Cp[ii - 1]])
-                Cm[ii] = np.max([0, -k - ((cusum_np_arr[ii] - mu) / sd) + Cm[ii - 1]])
+        Cp, Cm = cached_cusum(cusum_np_arr, mu, sd, k, APC_select == "Custom")
 
         Cont_limit_arr = np.array(h * np.ones((len(cusum_np_arr), 1)))
         Cont_lim_df = pd.DataFrame(Cont_limit_arr, columns=["h"])